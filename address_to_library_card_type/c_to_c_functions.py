@@ -1,18 +1,71 @@
 import requests
 import math
 from geopy.geocoders import Nominatim
+from geopy.adapters import AdapterHTTPError
+from geopy import exc as geopy_exc
 import pandas as pd
 import json
 import os
 from datetime import datetime
 import streamlit as st
 from filelock import FileLock, Timeout
+from shared_cache import cache
+from metrics import track_upstream
+
+# Upstream locations can be pointed at local stubs (see bench/)
+NOMINATIM_DOMAIN = os.environ.get('NOMINATIM_DOMAIN', 'nominatim.openstreetmap.org')
+NOMINATIM_SCHEME = os.environ.get('NOMINATIM_SCHEME', 'https')
+CENSUS_REPORTER_API_URL = os.environ.get('CENSUS_REPORTER_API_URL', 'https://api.censusreporter.org/1.0')
+
+# Addresses and census geographies don't move, so these can be cached for a long time
+GEOCODE_CACHE_TTL = int(os.environ.get('GEOCODE_CACHE_TTL', 30 * 24 * 3600))
+CSUBDIVISION_CACHE_TTL = int(os.environ.get('CSUBDIVISION_CACHE_TTL', 30 * 24 * 3600))
 
 # Using the geopy library to take a street address as input and return lat and long coordinates
 def get_coordinates(street_address):
-    geolocator = Nominatim(user_agent="my_app")
-
-    location = geolocator.geocode(street_address, timeout=5)
+    # Shared across workers; failed lookups return None and are not cached
+    return cache.get_or_set(
+        f"geocode:{street_address.strip().lower()}",
+        lambda: _geocode(street_address),
+        ttl=GEOCODE_CACHE_TTL
+    )
+
+
+# Status codes for geopy exceptions that don't carry the HTTP error that caused them
+# (most specific first, since several are subclasses of GeocoderServiceError)
+GEOCODER_ERROR_STATUS = [
+    (geopy_exc.GeocoderRateLimited, 429),
+    (geopy_exc.GeocoderQuotaExceeded, 402),
+    (geopy_exc.GeocoderAuthenticationFailure, 401),
+    (geopy_exc.GeocoderInsufficientPrivileges, 403),
+    (geopy_exc.GeocoderQueryError, 400),
+    (geopy_exc.GeocoderTimedOut, 504),
+    (geopy_exc.GeocoderUnavailable, 503),
+    (geopy_exc.GeocoderServiceError, 500),
+]
+
+
+def geocoder_error_status(error):
+    # geopy chains the adapter's HTTP error when the service answered with one
+    if isinstance(error.__cause__, AdapterHTTPError):
+        return error.__cause__.status_code
+    for error_class, status in GEOCODER_ERROR_STATUS:
+        if isinstance(error, error_class):
+            return status
+    return 'error'
+
+
+def _geocode(street_address):
+    geolocator = Nominatim(user_agent="my_app", domain=NOMINATIM_DOMAIN, scheme=NOMINATIM_SCHEME)
+
+    # geopy hides the HTTP response, so a completed lookup counts as 200
+    with track_upstream('nominatim') as call:
+        try:
+            location = geolocator.geocode(street_address, timeout=5)
+        except geopy_exc.GeopyError as e:
+            call['status'] = geocoder_error_status(e)
+            raise
+        call['status'] = 200
 
     if location:
         latitude = round(location.latitude, 5)
@@ -41,17 +94,25 @@ def coordinates_to_csubdivision(latitude, longitude):
     # Convert latitude and longitude to tile x and y
     x, y = latlon_to_tile(latitude, longitude, zoom)
 
+    cache_key = f"csubdivision:{release}:{sumlevel}:{zoom}:{x}:{y}"
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+
     # URL format from census reporter API Docs https://github.com/censusreporter/census-api/blob/master/API.md
-    url = f"https://api.censusreporter.org/1.0/geo/{release}/tiles/{sumlevel}/{zoom}/{x}/{y}.geojson"
+    url = f"{CENSUS_REPORTER_API_URL}/geo/{release}/tiles/{sumlevel}/{zoom}/{x}/{y}.geojson"
 
     # Making request to census reporter 
-    response = requests.get(url)
+    with track_upstream('census_reporter') as call:
+        response = requests.get(url)
+        call['status'] = response.status_code
     data = response.json()
 
     # Parsing the returned GeoJson output, only returning county subdivision
     full_name = data['features'][0]['properties']['name']
     county_subdivision = full_name.split(",")[0]
 
+    cache.set(cache_key, (county_subdivision, full_name), ttl=CSUBDIVISION_CACHE_TTL)
     return county_subdivision, full_name
 
 
@@ -0,0 +1,60 @@
+# bench/common.py
+"""Helpers shared by the bench scripts: starting the stubs and the app, and the HTTP client."""
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import aiohttp
+
+from stubs import upstream_env
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def wait_until_up(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(url) as response:
+                    await response.read()
+                    return
+            except aiohttp.ClientError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not come up within {timeout}s")
+
+
+def start_stubs(port, options=()):
+    """Start bench/stubs.py on consecutive ports from port; options are extra CLI arguments"""
+    command = [sys.executable, os.path.join(REPO_ROOT, 'bench', 'stubs.py'), '--port', str(port), *options]
+    stubs = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # Every stub answers 404 on / once it is listening
+    asyncio.run(wait_until_up(f"http://127.0.0.1:{port}/"))
+    return stubs
+
+
+def start_app(port, stub_port, **env):
+    """Start start.py on port with every upstream pointed at the stubs on stub_port"""
+    env = dict(os.environ, **upstream_env(stub_port), PORT=str(port), PROFILING_ENABLED='false',
+               **{key: str(value) for key, value in env.items()})
+    server = subprocess.Popen([sys.executable, 'start.py'], cwd=REPO_ROOT, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    asyncio.run(wait_until_up(f"http://127.0.0.1:{port}/"))
+    return server
+
+
+def stop(process):
+    process.terminate()
+    process.wait(timeout=30)
+
+
+def client_session(concurrency, keep_alive=True):
+    """Session with one connection per concurrent client.
+
+    keep_alive=False opens a new connection for every request, which shows
+    connection setup cost and rules out keep-alive effects when comparing runs.
+    """
+    connector = aiohttp.TCPConnector(limit=concurrency, force_close=not keep_alive)
+    return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=300))
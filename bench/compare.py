@@ -0,0 +1,82 @@
+# bench/compare.py
+"""Compare two bench/run.py result files.
+
+Prints the change in latency percentiles, throughput and peak RSS for every
+scenario/concurrency pair present in both files. With --fail-above, exits
+non-zero if any p95 latency or throughput regresses by more than that percentage.
+
+    python bench/compare.py bench-abc123.json bench-def456.json --fail-above 10
+"""
+import argparse
+import json
+import sys
+
+# metric -> (how to read it from a result, whether higher is better)
+METRICS = {
+    'p50_ms': (lambda r: r['latency_ms']['p50'], False),
+    'p95_ms': (lambda r: r['latency_ms']['p95'], False),
+    'p99_ms': (lambda r: r['latency_ms']['p99'], False),
+    'rps': (lambda r: r['throughput_rps'], True),
+    'rss_mb': (lambda r: r['peak_rss_mb'], False),
+}
+GATED_METRICS = ('p95_ms', 'rps')
+# Results are only comparable if these match
+SETUP = ('cache', 'keep_alive')
+
+
+def load(path):
+    with open(path) as f:
+        report = json.load(f)
+    return report, {(r['scenario'], r['concurrency']): r for r in report['results']}
+
+
+def change(old, new):
+    if old in (None, 0) or new is None:
+        return None
+    return (new - old) / old * 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--fail-above', type=float, help='allowed regression in percent')
+    args = parser.parse_args()
+
+    old_report, old_results = load(args.baseline)
+    new_report, new_results = load(args.candidate)
+    print(f"baseline  {old_report.get('commit')}{' (dirty)' if old_report.get('dirty') else ''}")
+    print(f"candidate {new_report.get('commit')}{' (dirty)' if new_report.get('dirty') else ''}")
+    print()
+    print(f"{'scenario':<18} {'conc':>4}  " + '  '.join(f"{name:>25}" for name in METRICS))
+
+    regressions = []
+    for key in sorted(old_results.keys() & new_results.keys()):
+        cells = []
+        for name, (read, higher_is_better) in METRICS.items():
+            old, new = read(old_results[key]), read(new_results[key])
+            delta = change(old, new)
+            cells.append(f"{old!s:>8} -> {new!s:>8} {'' if delta is None else f'{delta:+.0f}%':>4}")
+            if args.fail_above is not None and name in GATED_METRICS and delta is not None:
+                worse = -delta if higher_is_better else delta
+                if worse > args.fail_above:
+                    regressions.append(f"{key[0]} c={key[1]} {name} {delta:+.1f}%")
+        print(f"{key[0]:<18} {key[1]:>4}  " + '  '.join(cells))
+        for field in SETUP:
+            old, new = old_results[key].get(field), new_results[key].get(field)
+            if old != new:
+                print(f"{'':<18} {'':>4}  warning: {field} differs ({old} -> {new})")
+
+    for key in sorted(old_results.keys() ^ new_results.keys()):
+        print(f"{key[0]:<18} {key[1]:>4}  only in {'baseline' if key in old_results else 'candidate'}")
+
+    if regressions:
+        print()
+        print(f"Regressions above {args.fail_above}%:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+# bench/run.py
+"""Offline benchmark: drive each blueprint route against local upstream stubs.
+
+Starts bench/stubs.py, then for every scenario and concurrency level starts
+start.py pointed at the stubs with an empty cache, drives the route for a
+fixed duration and writes p50/p95/p99 latency, throughput, status counts,
+peak server RSS and the server's own view of the run (mean latency from
+http_request_duration_seconds, cache hits and misses) as JSON. Compare two
+result files with bench/compare.py.
+
+    python bench/run.py --concurrency 1 8 32 --duration 10 --output bench-$(git rev-parse --short HEAD).json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import math
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+from stubs import per_upstream
+from common import REPO_ROOT, client_session, start_app, start_stubs, stop
+
+# name -> (method, path, request kwargs for the i-th request)
+SCENARIOS = {
+    'book-cover': ('GET', '/bookcover/book-cover',
+                   lambda i, pool: {'params': {'title_id': str(1000000 + i % pool)}}),
+    'get-library-card': ('POST', '/address_to_library_card_type/get_library_card',
+                         lambda i, pool: {'data': {'street_address': f"{i % pool} Main St, Ada, MI"}}),
+    'add-team-member': ('POST', '/api/add-team-member',
+                        lambda i, pool: {'json': {'email': f"bench{i}@example.org"}}),
+    'submissions': ('GET', '/submission_review/',
+                    lambda i, pool: {}),
+}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def process_tree(pid):
+    """pid plus all of its descendants, read from /proc"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name is in parentheses and may contain spaces
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, []))
+    return tree
+
+
+def peak_rss_mb(pid):
+    """Sum of peak resident set size (VmHWM) over the server's process tree"""
+    total_kb = 0
+    for member in process_tree(pid):
+        try:
+            with open(f'/proc/{member}/status') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        total_kb += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+    return round(total_kb / 1024, 1)
+
+
+async def run_level(base_url, scenario, concurrency, duration, pool, keep_alive):
+    method, path, build = SCENARIOS[scenario]
+    latencies = []
+    status_counts = {}
+    counter = 0
+    deadline = time.monotonic() + duration
+
+    async def client(session):
+        nonlocal counter
+        while time.monotonic() < deadline:
+            counter += 1
+            kwargs = build(counter, pool)
+            start = time.perf_counter()
+            try:
+                async with session.request(method, base_url + path, **kwargs) as response:
+                    await response.read()
+                    status = str(response.status)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                status = 'error'
+            latencies.append(time.perf_counter() - start)
+            status_counts[status] = status_counts.get(status, 0) + 1
+
+    async with client_session(concurrency, keep_alive) as session:
+        started = time.monotonic()
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+        elapsed = time.monotonic() - started
+
+    latencies.sort()
+    ok = sum(count for status, count in status_counts.items() if status.startswith('2'))
+    return {
+        'requests': len(latencies),
+        'errors': len(latencies) - ok,
+        'status_counts': status_counts,
+        'seconds': round(elapsed, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+        'throughput_rps': round(ok / elapsed, 2),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+            'p95': round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+            'p99': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+            'max': round(latencies[-1] * 1000, 2) if latencies else None,
+        },
+    }
+
+
+METRIC_LINE = re.compile(r'^(\w+)(?:\{(.*)\})? (\S+)$')
+LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+async def server_metrics(base_url, route, method):
+    """What the app itself recorded for route: mean latency and cache lookups"""
+    async with aiohttp.ClientSession() as session:
+        async with session.get(base_url + '/metrics') as response:
+            text = await response.text()
+
+    samples = {}
+    for line in text.splitlines():
+        match = METRIC_LINE.match(line)
+        if match:
+            name, labels, value = match.groups()
+            samples.setdefault(name, []).append((dict(LABEL.findall(labels or '')), float(value)))
+
+    def total(name, **labels):
+        return sum(value for sample_labels, value in samples.get(name, [])
+                   if all(sample_labels.get(key) == wanted for key, wanted in labels.items()))
+
+    count = total('http_request_duration_seconds_count', route=route, method=method)
+    seconds = total('http_request_duration_seconds_sum', route=route, method=method)
+    return {
+        'requests': int(count),
+        'mean_ms': round(seconds / count * 1000, 2) if count else None,
+        'cache_hits': int(total('cache_requests_total', result='hit')),
+        'cache_misses': int(total('cache_requests_total', result='miss')),
+    }
+
+
+def stub_options(args):
+    options = []
+    for option in ('latency', 'error_rate', 'throttle_rate'):
+        for value in getattr(args, option) or []:
+            options += [f"--{option.replace('_', '-')}", value]
+    return options
+
+
+def run_scenario_level(args, scenario, concurrency):
+    """Run one concurrency level against its own server and empty cache"""
+    method, path, _ = SCENARIOS[scenario]
+    base_url = f"http://127.0.0.1:{args.port}"
+    with tempfile.TemporaryDirectory() as cache_dir:
+        server = start_app(args.port, args.stub_port,
+                           WEB_CONCURRENCY=args.workers,
+                           CACHE_PATH=os.path.join(cache_dir, 'cache.sqlite3'),
+                           CACHE_ENABLED='false' if args.cold else 'true',
+                           SUBMITTABLE_RATE_LIMIT=args.submittable_rate_limit,
+                           LOG_LEVEL=args.log_level)
+        try:
+            result = asyncio.run(run_level(base_url, scenario, concurrency, args.duration, args.pool,
+                                           not args.no_keep_alive))
+            server_side = asyncio.run(server_metrics(base_url, path, method))
+            rss = peak_rss_mb(server.pid)
+        finally:
+            stop(server)
+    return dict(scenario=scenario, concurrency=concurrency,
+                cache='disabled' if args.cold else 'empty at start',
+                keep_alive=not args.no_keep_alive,
+                **result, peak_rss_mb=rss, server=server_side)
+
+
+def git_revision():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, text=True).strip()
+        dirty = bool(subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                             cwd=REPO_ROOT, text=True).strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenario', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--duration', type=float, default=10, help='seconds per concurrency level')
+    parser.add_argument('--workers', type=int, default=1, help='WEB_CONCURRENCY for the app')
+    parser.add_argument('--pool', type=int, default=100, help='distinct title IDs/addresses to cycle through')
+    parser.add_argument('--cold', action='store_true', help='disable the shared cache')
+    parser.add_argument('--no-keep-alive', action='store_true', help='open a new connection per request')
+    parser.add_argument('--submittable-rate-limit', type=int, default=1,
+                        help='SUBMITTABLE_RATE_LIMIT for the app (requests/second)')
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('--latency', action='append', help='passed to stubs.py')
+    parser.add_argument('--error-rate', action='append', help='passed to stubs.py')
+    parser.add_argument('--throttle-rate', action='append', help='passed to stubs.py')
+    parser.add_argument('--port', type=int, default=10200)
+    parser.add_argument('--stub-port', type=int, default=18000)
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    args = parser.parse_args()
+
+    # Validate stub options before starting anything
+    for option in ('latency', 'error_rate', 'throttle_rate'):
+        per_upstream(getattr(args, option), 0.0)
+
+    commit, dirty = git_revision()
+    report = {
+        'commit': commit,
+        'dirty': dirty,
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'results': [],
+    }
+
+    stubs = start_stubs(args.stub_port, stub_options(args))
+    try:
+        for scenario in args.scenario:
+            for concurrency in args.concurrency:
+                result = run_scenario_level(args, scenario, concurrency)
+                report['results'].append(result)
+                latency = result['latency_ms']
+                print(f"{scenario:<18} c={concurrency:<4} {result['throughput_rps']:>9.1f} req/s  "
+                      f"p50={latency['p50']}ms p95={latency['p95']}ms p99={latency['p99']}ms  "
+                      f"mean={result['mean_ms']}ms (server {result['server']['mean_ms']}ms)  "
+                      f"errors={result['errors']}  rss={result['peak_rss_mb']}MB", file=sys.stderr)
+    finally:
+        stop(stubs)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+# bench/stubs.py
+"""Local stand-ins for every third-party service the blueprints call.
+
+Each upstream gets its own port so latency and failures can be tuned per
+service. Options take either a single value for every upstream or
+name=value to override one, e.g. --latency 0.05 --latency submittable=0.3.
+
+    python bench/stubs.py --port 18000 --latency 0.05 --error-rate 0.01 --throttle-rate 0.01
+"""
+import argparse
+import asyncio
+import base64
+import random
+import sys
+import zlib
+
+from aiohttp import web
+
+UPSTREAMS = ('bibliocommons', 'syndetics', 'nominatim', 'census_reporter', 'submittable')
+
+# 1x1 transparent GIF
+COVER_GIF = base64.b64decode('R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7')
+
+SUBMISSIONS_PER_PAGE = 10
+SUBMISSION_PAGES = 3
+
+
+def upstream_env(port):
+    """Environment variables that point the app at stubs started on port"""
+    ports = {name: port + i for i, name in enumerate(UPSTREAMS)}
+    return {
+        'BIBLIOCOMMONS_API_KEY': 'stub',
+        'BIBLIOCOMMONS_API_URL': f"http://127.0.0.1:{ports['bibliocommons']}/v1",
+        'SYNDETICS_URL': f"http://127.0.0.1:{ports['syndetics']}",
+        'NOMINATIM_DOMAIN': f"127.0.0.1:{ports['nominatim']}",
+        'NOMINATIM_SCHEME': 'http',
+        'CENSUS_REPORTER_API_URL': f"http://127.0.0.1:{ports['census_reporter']}/1.0",
+        'SUBMITTABLE_API_KEY': 'stub',
+        'SUBMITTABLE_API_URL': f"http://127.0.0.1:{ports['submittable']}/v4",
+    }
+
+
+def fault_injection(latency, error_rate, throttle_rate):
+    @web.middleware
+    async def middleware(request, handler):
+        if latency:
+            await asyncio.sleep(latency)
+        roll = random.random()
+        if roll < throttle_rate:
+            return web.json_response({'error': 'Too Many Requests'}, status=429, headers={'Retry-After': '1'})
+        if roll < throttle_rate + error_rate:
+            return web.json_response({'error': 'Injected failure'}, status=500)
+        return await handler(request)
+    return middleware
+
+
+async def bibliocommons_title(request):
+    title_id = request.match_info['title_id']
+    isbn = f"978{zlib.crc32(title_id.encode()) % 10 ** 10:010d}"
+    return web.json_response({'title': {'id': title_id, 'isbns': [isbn]}})
+
+
+async def syndetics_cover(request):
+    return web.Response(body=COVER_GIF, content_type='image/gif')
+
+
+async def nominatim_search(request):
+    # Somewhere in Kent County, MI
+    return web.json_response([{
+        'lat': f"{42.9 + random.random() / 10:.5f}",
+        'lon': f"{-85.6 - random.random() / 10:.5f}",
+        'display_name': request.query.get('q', ''),
+    }])
+
+
+async def census_tile(request):
+    return web.json_response({'type': 'FeatureCollection', 'features': [
+        {'properties': {'name': 'Ada township, Kent County, MI', 'geoid': '06000US2608100220'}}
+    ]})
+
+
+async def submittable_add_team_member(request):
+    await request.json()
+    return web.Response(status=204)
+
+
+async def submittable_team(request):
+    members = [{'email': f"reviewer{i}@example.org", 'userId': str(i)} for i in range(150)]
+    return web.json_response({'teamMembers': members})
+
+
+async def submittable_submissions(request):
+    page = int(request.query.get('continuationToken', 0))
+    items = [{
+        'submissionId': f"sub-{page}-{i}",
+        'submissionTitle': f"Story {page}-{i}",
+        'submissionStatus': 'completed',
+    } for i in range(SUBMISSIONS_PER_PAGE)]
+    next_page = page + 1 if page + 1 < SUBMISSION_PAGES else None
+    return web.json_response({'items': items, 'continuationToken': next_page})
+
+
+async def submittable_reviews(request):
+    count = random.randint(0, 3)
+    return web.json_response([
+        {'status': 'completed', 'completedAt': f"2024-11-{i + 1:02d}T12:00:00Z"} for i in range(count)
+    ])
+
+
+ROUTES = {
+    'bibliocommons': [web.get('/v1/titles/{title_id}', bibliocommons_title)],
+    'syndetics': [web.get('/index.aspx', syndetics_cover)],
+    'nominatim': [web.get('/search', nominatim_search)],
+    'census_reporter': [web.get('/1.0/geo/{release}/tiles/{sumlevel}/{zoom}/{x}/{y}.geojson', census_tile)],
+    'submittable': [
+        web.post('/v4/organizations/team', submittable_add_team_member),
+        web.get('/v4/organizations/team', submittable_team),
+        web.get('/v4/submissions', submittable_submissions),
+        web.get('/v4/entries/submissions/{submission_id}/reviews', submittable_reviews),
+    ],
+}
+
+
+def per_upstream(values, default):
+    """Turn ['0.05', 'submittable=0.3'] into {upstream: float}"""
+    settings = dict.fromkeys(UPSTREAMS, default)
+    for value in values or []:
+        name, _, number = value.rpartition('=')
+        if name and name not in UPSTREAMS:
+            raise SystemExit(f"Unknown upstream {name!r}; expected one of {', '.join(UPSTREAMS)}")
+        for upstream in ([name] if name else UPSTREAMS):
+            settings[upstream] = float(number)
+    return settings
+
+
+async def serve(port, latency, error_rate, throttle_rate):
+    runners = []
+    for i, name in enumerate(UPSTREAMS):
+        app = web.Application(middlewares=[fault_injection(latency[name], error_rate[name], throttle_rate[name])])
+        app.add_routes(ROUTES[name])
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', port + i).start()
+        runners.append(runner)
+        print(f"{name} stub listening on 127.0.0.1:{port + i}", file=sys.stderr)
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=18000, help='first port; upstreams use consecutive ports')
+    parser.add_argument('--latency', action='append', help='seconds added to every response')
+    parser.add_argument('--error-rate', action='append', help='fraction of requests answered with 500')
+    parser.add_argument('--throttle-rate', action='append', help='fraction of requests answered with 429')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(
+            args.port,
+            per_upstream(args.latency, 0.0),
+            per_upstream(args.error_rate, 0.0),
+            per_upstream(args.throttle_rate, 0.0),
+        ))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
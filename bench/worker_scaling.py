@@ -0,0 +1,91 @@
+# bench/worker_scaling.py
+"""Load test showing how throughput scales with the number of hypercorn workers.
+
+Starts the upstream stubs, then start.py once per worker count with a fresh
+shared cache, and hammers /bookcover/book-cover over a pool of title IDs with
+a fixed number of concurrent clients. The first request for each title goes
+to the stubs; the rest are served from the cache every worker shares.
+
+    python bench/worker_scaling.py --workers 1 2 4 --concurrency 32 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+from common import client_session, start_app, start_stubs, stop
+
+
+async def hammer(url, concurrency, duration, pool, keep_alive):
+    completed = 0
+    errors = 0
+    counter = 0
+    deadline = time.monotonic() + duration
+
+    async def client(session):
+        nonlocal completed, errors, counter
+        while time.monotonic() < deadline:
+            counter += 1
+            try:
+                async with session.get(url, params={'title_id': str(1000000 + counter % pool)}) as response:
+                    await response.read()
+                    if response.status == 200:
+                        completed += 1
+                    else:
+                        errors += 1
+            except aiohttp.ClientError:
+                errors += 1
+
+    async with client_session(concurrency, keep_alive) as session:
+        started = time.monotonic()
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+        elapsed = time.monotonic() - started
+
+    return {'requests': completed, 'errors': errors, 'seconds': round(elapsed, 2),
+            'requests_per_second': round(completed / elapsed, 1)}
+
+
+def run_with_workers(workers, args):
+    with tempfile.TemporaryDirectory() as cache_dir:
+        server = start_app(args.port, args.stub_port, WEB_CONCURRENCY=workers,
+                           CACHE_PATH=os.path.join(cache_dir, 'cache.sqlite3'), LOG_LEVEL='WARNING')
+        try:
+            result = asyncio.run(hammer(f"http://127.0.0.1:{args.port}/bookcover/book-cover",
+                                        args.concurrency, args.duration, args.pool, not args.no_keep_alive))
+        finally:
+            stop(server)
+    return dict(result, workers=workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--pool', type=int, default=100, help='distinct title IDs to cycle through')
+    parser.add_argument('--no-keep-alive', action='store_true', help='open a new connection per request')
+    parser.add_argument('--port', type=int, default=10100)
+    parser.add_argument('--stub-port', type=int, default=18000)
+    args = parser.parse_args()
+
+    results = []
+    stubs = start_stubs(args.stub_port)
+    try:
+        for workers in args.workers:
+            result = run_with_workers(workers, args)
+            results.append(result)
+            print(f"{workers} worker(s): {result['requests_per_second']} req/s "
+                  f"({result['requests']} ok, {result['errors']} errors)", file=sys.stderr)
+    finally:
+        stop(stubs)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
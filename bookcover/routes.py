@@ -6,18 +6,23 @@ import io
 import logging
 from requests.exceptions import RequestException
 import sys
+from shared_cache import cache
+from metrics import track_upstream
 from . import bookcover_bp
 
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
+# Upstream base URLs can be pointed at local stubs (see bench/)
+BIBLIOCOMMONS_API_URL = os.getenv('BIBLIOCOMMONS_API_URL', 'https://api.bibliocommons.com/v1')
+SYNDETICS_URL = os.getenv('SYNDETICS_URL', 'https://secure.syndetics.com')
+
+# Title records rarely change; cover images change even less
+ISBN_CACHE_TTL = int(os.getenv('BOOKCOVER_ISBN_CACHE_TTL', 24 * 3600))
+IMAGE_CACHE_TTL = int(os.getenv('BOOKCOVER_IMAGE_CACHE_TTL', 7 * 24 * 3600))
+
 class BookCoverError(Exception):
     """Custom exception for book cover retrieval errors"""
     def __init__(self, message, status_code=500):
@@ -31,6 +36,111 @@ def handle_book_cover_error(error):
     response.status_code = error.status_code
     return response
 
+def fetch_isbn(book_title_id, api_key):
+    """Return the first ISBN BiblioCommons has for a title ID"""
+    # Prepare the API URL
+    if book_title_id:
+        api_url = (f"{BIBLIOCOMMONS_API_URL}/titles/{book_title_id}?"
+                  f"library=kdl&api_key={api_key}")
+    #else:
+    #    encoded_title = requests.utils.quote(book_title)
+    #    api_url = (f"https://api.bibliocommons.com/v1/titles?"
+    #              f"library=kdl&search_type=custom&"
+    #              f"q=formatcode%3A(BK )%20%20anywhere%3A({encoded_title})&"
+    #              f"api_key={api_key}")
+
+    try:
+        # Make the API request with timeout
+        with track_upstream('bibliocommons') as call:
+            response = requests.get(api_url, timeout=10)
+            call['status'] = response.status_code
+        response.raise_for_status()  # Raises an HTTPError for bad responses
+    except requests.exceptions.Timeout:
+        raise BookCoverError(
+            "Request to Bibliocommons API timed out. Please try again.",
+            status_code=504
+        )
+    except requests.exceptions.HTTPError as e:
+        if response.status_code == 401:
+            raise BookCoverError(
+                "Invalid API key or unauthorized access.",
+                status_code=401
+            )
+        elif response.status_code == 429:
+            raise BookCoverError(
+                "Rate limit exceeded. Please try again later.",
+                status_code=429
+            )
+        else:
+            raise BookCoverError(
+                f"Bibliocommons API error: {str(e)}",
+                status_code=response.status_code
+            )
+    except RequestException as e:
+        raise BookCoverError(
+            f"Error connecting to Bibliocommons API: {str(e)}",
+            status_code=503
+        )
+
+    try:
+        data = response.json()
+    except ValueError:
+        raise BookCoverError(
+            "Invalid JSON response from Bibliocommons API",
+            status_code=502
+        )
+
+    # Check if we got valid data structure
+    if not isinstance(data, dict):
+        raise BookCoverError(
+            "Unexpected response format from API",
+            status_code=502
+        )
+
+    # Check if ISBN exists
+    if (not data.get('title') or 
+        not data['title'].get('isbns') or 
+        not data['title']['isbns']):
+        raise BookCoverError(
+            f"No ISBN found for book ID: {book_title_id}, URL = " + api_url,
+            status_code=404
+        )
+
+    # Get the first ISBN
+    return data['title']['isbns'][0]
+
+def fetch_cover_image(isbn):
+    """Return the Syndetics cover image bytes and content type for an ISBN"""
+    # Construct image URL
+    image_url = f"{SYNDETICS_URL}/index.aspx?isbn={isbn}/LC.GIF"
+    
+    try:
+        # Fetch the image with timeout
+        with track_upstream('syndetics') as call:
+            image_response = requests.get(image_url, timeout=10)
+            call['status'] = image_response.status_code
+        image_response.raise_for_status()
+    except requests.exceptions.Timeout:
+        raise BookCoverError(
+            "Request to Syndetics API timed out. Please try again.",
+            status_code=504
+        )
+    except RequestException as e:
+        raise BookCoverError(
+            f"Error retrieving book cover image: {str(e)}",
+            status_code=503
+        )
+
+    # Check if we got an actual image
+    content_type = image_response.headers.get('content-type', '')
+    if not content_type.startswith('image/'):
+        raise BookCoverError(
+            "Retrieved content is not an image",
+            status_code=502
+        )
+
+    return image_response.content, content_type
+
 @bookcover_bp.route('/book-cover', methods=['GET'])
 def get_book_cover():
     try:
@@ -56,110 +166,27 @@ def get_book_cover():
                 status_code=400
             )
 
-        # Prepare the API URL
-        if book_title_id:
-            api_url = (f"https://api.bibliocommons.com/v1/titles/{book_title_id}?"
-                      f"library=kdl&api_key={api_key}")
-        #else:
-        #    encoded_title = requests.utils.quote(book_title)
-        #    api_url = (f"https://api.bibliocommons.com/v1/titles?"
-        #              f"library=kdl&search_type=custom&"
-        #              f"q=formatcode%3A(BK )%20%20anywhere%3A({encoded_title})&"
-        #              f"api_key={api_key}")
-
-        try:
-            # Make the API request with timeout
-            response = requests.get(api_url, timeout=10)
-            response.raise_for_status()  # Raises an HTTPError for bad responses
-        except requests.exceptions.Timeout:
-            raise BookCoverError(
-                "Request to Bibliocommons API timed out. Please try again.",
-                status_code=504
-            )
-        except requests.exceptions.HTTPError as e:
-            if response.status_code == 401:
-                raise BookCoverError(
-                    "Invalid API key or unauthorized access.",
-                    status_code=401
-                )
-            elif response.status_code == 429:
-                raise BookCoverError(
-                    "Rate limit exceeded. Please try again later.",
-                    status_code=429
-                )
-            else:
-                raise BookCoverError(
-                    f"Bibliocommons API error: {str(e)}",
-                    status_code=response.status_code
-                )
-        except RequestException as e:
-            raise BookCoverError(
-                f"Error connecting to Bibliocommons API: {str(e)}",
-                status_code=503
-            )
-
-        try:
-            data = response.json()
-        except ValueError:
-            raise BookCoverError(
-                "Invalid JSON response from Bibliocommons API",
-                status_code=502
-            )
-
-        # Check if we got valid data structure
-        if not isinstance(data, dict):
-            raise BookCoverError(
-                "Unexpected response format from API",
-                status_code=502
-            )
-
-        # Check if ISBN exists
-        if (not data.get('title') or 
-            not data['title'].get('isbns') or 
-            not data['title']['isbns']):
-            raise BookCoverError(
-                f"No ISBN found for book ID: {book_title_id}, URL = " + api_url,
-                status_code=404
-            )
-
-        # Get the first ISBN
-        isbn = data['title']['isbns'][0]
-        
-        # Construct image URL
-        image_url = f"https://secure.syndetics.com/index.aspx?isbn={isbn}/LC.GIF"
-        
-        try:
-            # Fetch the image with timeout
-            image_response = requests.get(image_url, timeout=10)
-            image_response.raise_for_status()
-        except requests.exceptions.Timeout:
-            raise BookCoverError(
-                "Request to Syndetics API timed out. Please try again.",
-                status_code=504
-            )
-        except RequestException as e:
-            raise BookCoverError(
-                f"Error retrieving book cover image: {str(e)}",
-                status_code=503
-            )
-
-        # Check if we got an actual image
-        content_type = image_response.headers.get('content-type', '')
-        if not content_type.startswith('image/'):
-            raise BookCoverError(
-                "Retrieved content is not an image",
-                status_code=502
-            )
+        # Look up the ISBN and cover image through the shared cache so every worker benefits
+        isbn = cache.get_or_set(
+            f"bookcover:isbn:{book_title_id}",
+            lambda: fetch_isbn(book_title_id, api_key),
+            ttl=ISBN_CACHE_TTL
+        )
+        image_content, content_type = cache.get_or_set(
+            f"bookcover:image:{isbn}",
+            lambda: fetch_cover_image(isbn),
+            ttl=IMAGE_CACHE_TTL
+        )
 
         # Return the image
         return send_file(
-            io.BytesIO(image_response.content),
+            io.BytesIO(image_content),
             mimetype=content_type
         )
 
     except BookCoverError as e:
         # Log the error and re-raise it to be handled by the error handler
-        logger.error(f"Book cover error: {str(e)}")
+        logger.error("Book cover error: %s", e)
         raise
 
     except Exception as e:
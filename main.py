@@ -1,7 +1,10 @@
 # main.py
 from flask import Flask
 import os
+import logging
 from dotenv import load_dotenv
+import metrics
+import profiling
 from reviewer_signup import reviewer_bp
 from submission_review import submissions_bp
 from bookcover import bookcover_bp
@@ -10,6 +13,17 @@ from address_to_library_card_type import address_to_library_card_type_bp
 # Load environment variables
 load_dotenv()
 
+def configure_logging(app):
+    # LOG_LEVEL sets the default; LOG_LEVEL_<BLUEPRINT> (e.g. LOG_LEVEL_REVIEWER=DEBUG) overrides one blueprint
+    logging.basicConfig(
+        level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    for name, blueprint in app.blueprints.items():
+        level = os.environ.get(f'LOG_LEVEL_{name.upper()}')
+        if level:
+            logging.getLogger(blueprint.import_name).setLevel(level.upper())
+
 def create_app():
     app = Flask(__name__)
     
@@ -18,6 +32,10 @@ def create_app():
     app.register_blueprint(submissions_bp)
     app.register_blueprint(bookcover_bp)
     app.register_blueprint(address_to_library_card_type_bp)
+
+    configure_logging(app)
+    metrics.init_app(app)
+    profiling.init_app(app)
     
     return app
 
@@ -0,0 +1,329 @@
+# metrics.py
+import json
+import os
+import socket
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from flask import Response, g, request
+
+logger = logging.getLogger(__name__)
+
+# Default Prometheus latency buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Workers write their counters to the shared cache file this often (and on every scrape)
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+# Snapshots from workers that stopped reporting longer ago than this are dropped
+METRICS_RETENTION = float(os.environ.get('METRICS_RETENTION', 24 * 3600))
+# Workers that have not flushed for this long are treated as stopped
+METRICS_LIVE_WINDOW = 3 * METRICS_FLUSH_INTERVAL
+
+# Unique per process lifetime, so a reused pid never overwrites a finished worker's totals
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}-{time.time_ns()}"
+
+_registry = []
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+class _Metric:
+    kind = None
+    # Whether stopped workers' last snapshots still count towards the total
+    includes_stopped_workers = True
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self):
+        """This process's values as [[label values], value] pairs"""
+        with self._lock:
+            return [[list(key), self._snapshot(value)] for key, value in self._values.items()]
+
+    def _snapshot(self, value):
+        return value
+
+    def merge(self, total, value):
+        """Combine one worker's value into the running total across workers"""
+        return value if total is None else total + value
+
+    def render(self, values):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for key, value in sorted(values.items()):
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {value}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), aggregate='sum', latest_by=None):
+        super().__init__(name, documentation, labelnames)
+        # 'sum' for things like in-progress counts (live workers only), 'max' for timestamps,
+        # 'latest' for the value from the worker with the highest latest_by gauge
+        self.aggregate = aggregate
+        self.latest_by = latest_by
+        self.includes_stopped_workers = aggregate != 'sum'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def merge(self, total, value):
+        if total is None:
+            return value
+        return max(total, value) if self.aggregate == 'max' else total + value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def _snapshot(self, state):
+        return [list(state[0]), state[1], state[2]]
+
+    def merge(self, total, state):
+        if total is None:
+            return [list(state[0]), state[1], state[2]]
+        return [[a + b for a, b in zip(total[0], state[0])], total[1] + state[1], total[2] + state[2]]
+
+    def _render_sample(self, key, state):
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labelnames, key, [('le', bound)])
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.labelnames, key, [('le', '+Inf')])
+        lines.append(f'{self.name}_bucket{labels} {count}')
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f'{self.name}_sum{labels} {total}')
+        lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+http_request_duration = Histogram(
+    'http_request_duration_seconds', 'Request latency by route.', ['route', 'method'])
+http_requests = Counter(
+    'http_requests_total', 'Requests by route and response status.', ['route', 'method', 'status'])
+
+upstream_request_duration = Histogram(
+    'upstream_request_duration_seconds', 'Latency of calls to third-party services.', ['upstream'])
+upstream_requests = Counter(
+    'upstream_requests_total', 'Calls to third-party services by status code.', ['upstream', 'status'])
+
+cache_requests = Counter(
+    'cache_requests_total', 'Shared cache lookups by key namespace and result.', ['namespace', 'result'])
+
+crawl_in_progress = Gauge(
+    'submission_crawl_in_progress', 'Number of submission crawls currently running.')
+crawl_pages = Counter(
+    'submission_crawl_pages_total', 'Submission list pages fetched from Submittable.')
+crawl_submissions = Counter(
+    'submission_crawl_submissions_total', 'Submissions whose reviews have been checked.')
+crawl_last_completed = Gauge(
+    'submission_crawl_last_completed_timestamp_seconds', 'Unix time the most recent crawl finished.',
+    aggregate='max')
+crawl_last_duration = Gauge(
+    'submission_crawl_last_duration_seconds', 'Duration of the most recent completed crawl.',
+    aggregate='latest', latest_by=crawl_last_completed)
+
+
+@contextmanager
+def track_upstream(upstream):
+    """Time a call to a third-party service.
+
+    Set call['status'] to the response status inside the block; calls that
+    raise before doing so are counted with status "error".
+    """
+    call = {'status': 'error'}
+    start = time.perf_counter()
+    try:
+        yield call
+    finally:
+        upstream_request_duration.observe(time.perf_counter() - start, upstream=upstream)
+        upstream_requests.inc(upstream=upstream, status=call['status'])
+
+
+def record_cache_lookup(key, hit):
+    cache_requests.inc(namespace=key.split(':', 1)[0], result='hit' if hit else 'miss')
+
+
+def local_snapshot():
+    return {metric.name: metric.snapshot() for metric in _registry}
+
+
+def flush():
+    """Write this worker's counters to the shared cache file"""
+    # Imported here because shared_cache records its lookups through this module
+    from shared_cache import cache
+    cache.store_worker_metrics(WORKER_ID, json.dumps(local_snapshot()))
+
+
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def _flush_forever():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception as e:
+            logger.error(f"Could not write metrics snapshot: {str(e)}")
+
+
+def _start_flusher():
+    # Started from the first request so it runs inside each spawned worker
+    global _flusher
+    with _flusher_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_forever, name='metrics-flusher', daemon=True)
+            _flusher.start()
+
+
+def _sample(snapshot, metric, key):
+    for sample_key, value in snapshot.get(metric.name, []):
+        if tuple(sample_key) == key:
+            return value
+    return None
+
+
+def collect():
+    """Merge the latest snapshot of every worker into {metric name: {labels: value}}.
+
+    Stopped workers keep their last snapshot until METRICS_RETENTION, so
+    counters don't drop when a worker restarts (they do once it expires).
+    Summed gauges only count workers that flushed within METRICS_LIVE_WINDOW.
+    """
+    from shared_cache import cache
+    now = time.time()
+    try:
+        flush()
+        snapshots = {worker: (json.loads(data), updated_at)
+                     for worker, (data, updated_at) in cache.worker_metrics(METRICS_RETENTION).items()}
+    except Exception as e:
+        logger.error(f"Could not read shared metrics, reporting this worker only: {str(e)}")
+        snapshots = {}
+    snapshots[WORKER_ID] = (local_snapshot(), now)
+
+    merged = {metric.name: {} for metric in _registry}
+    # (metric name, labels) -> latest_by value of the snapshot the merged 'latest' value came from
+    latest_seen = {}
+    by_name = {metric.name: metric for metric in _registry}
+    for snapshot, updated_at in snapshots.values():
+        live = updated_at >= now - METRICS_LIVE_WINDOW
+        for name, samples in snapshot.items():
+            metric = by_name.get(name)
+            if metric is None or not (live or metric.includes_stopped_workers):
+                continue
+            values = merged[name]
+            for key, value in samples:
+                key = tuple(key)
+                if isinstance(metric, Gauge) and metric.aggregate == 'latest':
+                    seen = _sample(snapshot, metric.latest_by, key)
+                    if seen is None or (key in values and seen <= latest_seen[name, key]):
+                        continue
+                    latest_seen[name, key] = seen
+                    values[key] = value
+                else:
+                    values[key] = metric.merge(values.get(key), value)
+    return merged
+
+
+def render(merged=None):
+    merged = collect() if merged is None else merged
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render(merged[metric.name]))
+
+    # Hit ratio is derived from the lookup counter so reads stay a single increment
+    lines.append('# HELP cache_hit_ratio Fraction of shared cache lookups that were hits, by namespace.')
+    lines.append('# TYPE cache_hit_ratio gauge')
+    lookups = merged[cache_requests.name]
+    for namespace in sorted({namespace for namespace, _ in lookups}):
+        hits = lookups.get((namespace, 'hit'), 0)
+        total = hits + lookups.get((namespace, 'miss'), 0)
+        labels = _format_labels(('namespace',), (namespace,))
+        lines.append(f'cache_hit_ratio{labels} {hits / total if total else 0}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    """Record per-route latency for every request and serve /metrics.
+
+    Each worker counts in memory and writes a snapshot to the shared cache
+    file every METRICS_FLUSH_INTERVAL seconds; /metrics sums all workers.
+    """
+    @app.before_request
+    def start_timer():
+        if _flusher is None:
+            _start_flusher()
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            http_request_duration.observe(time.perf_counter() - start, route=route, method=request.method)
+            http_requests.inc(route=route, method=request.method, status=response.status_code)
+        return response
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        return Response(render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,273 @@
+# profiling.py
+"""Opt-in per-request stack-sampling profiler.
+
+Nothing is registered unless PROFILING_ENABLED=true. When enabled, a request is
+profiled if it carries a valid X-Profile-Signature header (see sign()) or is
+picked at random by PROFILING_SAMPLE_RATE. Profiles are written to PROFILE_DIR
+as collapsed stacks ("frame;frame;frame count"), which flamegraph.pl,
+speedscope and inferno read directly.
+
+Async views are followed onto the event loop thread asgiref runs them on, and
+CPU time is summed over every thread that worked on the request.
+
+    python profiling.py sign /bookcover/book-cover   # prints a header value
+"""
+import asyncio
+import collections
+import functools
+import hashlib
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+import logging
+from dotenv import load_dotenv
+from flask import Response, abort, g, jsonify, request
+from shared_cache import CACHE_DIR, private_dir
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() == 'true'
+PROFILING_SECRET = os.environ.get('PROFILING_SECRET', '')
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_INTERVAL = float(os.environ.get('PROFILING_INTERVAL', 0.005))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(CACHE_DIR, 'profiles'))
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 50))
+
+SIGNATURE_HEADER = 'X-Profile-Signature'
+
+
+def sign(path, ttl=300, secret=None):
+    """Return an X-Profile-Signature value that is valid for path for ttl seconds"""
+    expires = int(time.time()) + ttl
+    digest = hmac.new((secret or PROFILING_SECRET).encode(), f"{expires}:{path}".encode(), hashlib.sha256)
+    return f"{expires}:{digest.hexdigest()}"
+
+
+def signature_is_valid(value, path):
+    if not PROFILING_SECRET or not value:
+        return False
+    expires, _, digest = value.partition(':')
+    if not expires.isdecimal() or int(expires) < time.time():
+        return False
+    expected = hmac.new(PROFILING_SECRET.encode(), f"{expires}:{path}".encode(), hashlib.sha256)
+    return hmac.compare_digest(expected.hexdigest().encode(), digest.encode())
+
+
+def _frame_name(code):
+    filename = '/'.join(code.co_filename.replace(';', '_').split(os.sep)[-2:])
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _thread_stack(frame):
+    stack = []
+    while frame is not None:
+        stack.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _await_chain(coro):
+    """Frames of a suspended coroutine and everything it is awaiting, outermost first"""
+    stack = []
+    while coro is not None:
+        frame = getattr(coro, 'cr_frame', None) or getattr(coro, 'gi_frame', None)
+        if frame is None:
+            break
+        stack.append(_frame_name(frame.f_code))
+        coro = getattr(coro, 'cr_await', None) or getattr(coro, 'gi_yieldfrom', None)
+    return stack
+
+
+def _is_idle_loop(frame):
+    # An event loop with nothing to run sits in selectors.<Selector>.select()
+    return frame is not None and frame.f_code.co_name == 'select' and \
+        frame.f_code.co_filename.endswith('selectors.py')
+
+
+class StackSampler:
+    """Samples the stack of the thread currently doing a request's work.
+
+    That is the request thread, or, while an async view runs, the event loop
+    thread asgiref starts for it (see delegate()). When that loop is idle
+    waiting on I/O, each pending task's await chain is recorded instead,
+    ending in "(waiting)", so upstream waits are attributed to the code
+    awaiting them rather than to the selector.
+    """
+
+    def __init__(self, thread_id, interval=PROFILING_INTERVAL):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._targets = [(thread_id, None)]
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiling-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def delegate(self, thread_id, loop):
+        """Sample thread_id (running loop) instead of the current target until undelegate()"""
+        self._targets.append((thread_id, loop))
+
+    def undelegate(self):
+        self._targets.pop()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            thread_id, loop = self._targets[-1]
+            frame = sys._current_frames().get(thread_id)
+            if loop is not None and _is_idle_loop(frame):
+                for task in asyncio.all_tasks(loop):
+                    stack = _await_chain(task.get_coro())
+                    if stack:
+                        self.stacks[';'.join(['(asyncio task)'] + stack + ['(waiting)'])] += 1
+            elif frame is not None:
+                self.stacks[';'.join(_thread_stack(frame))] += 1
+
+
+class RequestProfile:
+    def __init__(self, sampler):
+        self.sampler = sampler
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.thread_time()
+        # CPU used by other threads working on this request (async view loops)
+        self.other_cpu = 0.0
+
+
+def _profile_coroutine(func):
+    """Let the sampler follow an async view onto the asgiref event loop thread"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        # asgiref copies the request's context into the loop thread, so g is available
+        profile = g.get('profile')
+        if profile is None:
+            return await func(*args, **kwargs)
+        cpu_start = time.thread_time()
+        profile.sampler.delegate(threading.get_ident(), asyncio.get_running_loop())
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            profile.sampler.undelegate()
+            profile.other_cpu += time.thread_time() - cpu_start
+    return wrapper
+
+
+def _save_profile(route, method, status, wall, cpu, sampler):
+    private_dir(PROFILE_DIR)
+    profile_id = f"{int(time.time() * 1000)}-{os.getpid()}"
+    profile = {
+        'id': profile_id,
+        'route': route,
+        'method': method,
+        'status': status,
+        'started_at': time.time() - wall,
+        'wall_seconds': round(wall, 6),
+        'cpu_seconds': round(cpu, 6),
+        'samples': sum(sampler.stacks.values()),
+        'interval_seconds': sampler.interval,
+        'stacks': dict(sampler.stacks),
+    }
+    with open(os.path.join(PROFILE_DIR, f"{profile_id}.json"), 'w') as f:
+        json.dump(profile, f)
+
+    # Keep only the newest PROFILE_KEEP profiles
+    names = sorted(n for n in os.listdir(PROFILE_DIR) if n.endswith('.json'))
+    for name in names[:-PROFILE_KEEP]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, name))
+        except FileNotFoundError:
+            pass
+
+
+def _load_profile(profile_id):
+    try:
+        with open(os.path.join(PROFILE_DIR, f"{profile_id}.json")) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _require_admin():
+    token = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not PROFILING_SECRET or not hmac.compare_digest(token.encode(), PROFILING_SECRET.encode()):
+        abort(403)
+
+
+def init_app(app):
+    """Register the profiling hooks and admin endpoints, if PROFILING_ENABLED is set"""
+    if not PROFILING_ENABLED:
+        return
+
+    # Async views run on an asgiref event loop thread; route them through the sampler too
+    async_to_sync = app.async_to_sync
+    app.async_to_sync = lambda func: async_to_sync(_profile_coroutine(func))
+
+    @app.before_request
+    def start_profile():
+        if not (signature_is_valid(request.headers.get(SIGNATURE_HEADER), request.path)
+                or (PROFILING_SAMPLE_RATE and random.random() < PROFILING_SAMPLE_RATE)):
+            return
+        g.profile = RequestProfile(StackSampler(threading.get_ident()))
+        g.profile.sampler.start()
+
+    @app.teardown_request
+    def finish_profile(exc):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return
+        wall = time.perf_counter() - profile.wall_start
+        cpu = time.thread_time() - profile.cpu_start + profile.other_cpu
+        sampler = profile.sampler
+        sampler.stop()
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        try:
+            _save_profile(route, request.method, 500 if exc else g.get('profile_status'), wall, cpu, sampler)
+        except OSError as e:
+            logger.error(f"Failed to save profile for {route}: {str(e)}")
+
+    @app.after_request
+    def remember_status(response):
+        if 'profile' in g:
+            g.profile_status = response.status_code
+        return response
+
+    @app.route('/admin/profiles')
+    def list_profiles():
+        _require_admin()
+        if not os.path.isdir(PROFILE_DIR):
+            return jsonify([])
+        profiles = []
+        for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+            profile = _load_profile(name[:-len('.json')]) if name.endswith('.json') else None
+            if profile:
+                profile.pop('stacks')
+                profiles.append(profile)
+        return jsonify(profiles)
+
+    @app.route('/admin/profiles/<profile_id>')
+    def get_profile(profile_id):
+        _require_admin()
+        profile = _load_profile(os.path.basename(profile_id))
+        if profile is None:
+            abort(404)
+        collapsed = '\n'.join(f"{stack} {count}" for stack, count in profile['stacks'].items())
+        return Response(collapsed + '\n', mimetype='text/plain')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3 or sys.argv[1] != 'sign':
+        sys.exit("usage: python profiling.py sign <path>")
+    if not PROFILING_SECRET:
+        sys.exit("PROFILING_SECRET is not set")
+    print(f"{SIGNATURE_HEADER}: {sign(sys.argv[2])}")
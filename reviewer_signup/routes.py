@@ -3,19 +3,53 @@ import os
 import requests
 import json
 from dotenv import load_dotenv
+from shared_cache import cache
+from metrics import track_upstream
 from . import reviewer_bp
 import logging
 import base64
 
-logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 SUBMITTABLE_API_KEY = os.getenv('SUBMITTABLE_API_KEY')
+SUBMITTABLE_API_URL = os.getenv('SUBMITTABLE_API_URL', 'https://submittable-api.submittable.com/v4')
 
 # Encode the API key in base64
 encoded_api_key = base64.b64encode(f"{SUBMITTABLE_API_KEY}:".encode()).decode()
 
+ROSTER_CACHE_KEY = 'reviewer:team_roster'
+ROSTER_CACHE_TTL = int(os.getenv('ROSTER_CACHE_TTL', 300))
+
+def get_team_roster(refresh=False):
+    """Return the Submittable team roster as (status_code, data), shared across workers.
+
+    Pass refresh=True after changing the team so the new member is visible.
+    """
+    if not refresh:
+        cached = cache.get(ROSTER_CACHE_KEY)
+        if cached is not None:
+            return 200, cached
+
+    with track_upstream('submittable') as call:
+        team_response = requests.get(
+            f'{SUBMITTABLE_API_URL}/organizations/team',
+            headers={
+                'Authorization': f'Basic {encoded_api_key}',
+                'Content-Type': 'application/json'
+            }
+        )
+        call['status'] = team_response.status_code
+    #logging.debug(f"Team status response: {team_response.status_code}, {team_response.text}")
+
+    if team_response.status_code != 200:
+        return team_response.status_code, None
+
+    team_data = team_response.json()
+    cache.set(ROSTER_CACHE_KEY, team_data, ttl=ROSTER_CACHE_TTL)
+    return 200, team_data
+
 @reviewer_bp.route('/')
 def home():
     return render_template('reviewer_signup/index.html')
@@ -27,6 +61,16 @@ def add_team_member():
         if not email:
             return jsonify({'error': 'Email is required'}), 400
 
+        # Members already on a cached roster don't need the POST. Don't fetch the roster
+        # just for this check: the POST's 400 "already added" answers the same question.
+        cached_roster = cache.get(ROSTER_CACHE_KEY)
+        if cached_roster is not None and any(
+                member.get('email') == email for member in cached_roster.get('teamMembers', [])):
+            return jsonify({
+                'status': 'already_member',
+                'message': 'This email is already associated with a team member.'
+            })
+
         headers = {
                 'Authorization': f'Basic {encoded_api_key}',
                 'Content-Type': 'application/json'
@@ -37,34 +81,29 @@ def add_team_member():
                 'title': 'WM Reviewer, unassigned'
         }
         
-        logging.debug(f"POST Payload: {json.dumps(payload)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("POST Payload: %s", json.dumps(payload))
         #logging.debug(f"Headers: {headers}")
 
         # Add to team
-        response = requests.post(
-            'https://submittable-api.submittable.com/v4/organizations/team',
-            headers=headers,
-            json=payload
-        )
+        with track_upstream('submittable') as call:
+            response = requests.post(
+                f'{SUBMITTABLE_API_URL}/organizations/team',
+                headers=headers,
+                json=payload
+            )
+            call['status'] = response.status_code
         #logging.debug(f"Add to team response: {response.status_code}, {response.text}")
         
         if response.status_code == 204:
-            # Check user status
-            team_response = requests.get(
-                'https://submittable-api.submittable.com/v4/organizations/team',
-                headers={
-                    'Authorization': f'Basic {encoded_api_key}',
-                    'Content-Type': 'application/json'
-                }
-            )
-            #logging.debug(f"Team status response: {team_response.status_code}, {team_response.text}")
+            # Check user status; the team just changed, so skip the cached roster
+            team_status, team_data = get_team_roster(refresh=True)
             
-            if team_response.status_code == 200:
-                team_data = team_response.json()
+            if team_status == 200:
                 user_id = None
                 team_members = team_data.get('teamMembers', [])
                 if not isinstance(team_members, list):
-                    logging.error("Invalid teamMembers format")
+                    logger.error("Invalid teamMembers format")
                     return jsonify({'error': 'Unexpected API response'}), 500
 
                 team_size = len(team_members)
@@ -94,7 +133,7 @@ def add_team_member():
         elif response.status_code == 400:
             try:
                 error_data = response.json()
-                logging.error(f"Error from API: {error_data}")
+                logger.error("Error from API: %s", error_data)
 
                 if error_data.get('messages') and 'already been added to your team' in error_data['messages'][0]:
                     return jsonify({
@@ -102,11 +141,11 @@ def add_team_member():
                         'message': 'This email is already associated with a team member.'
                     })
             except requests.exceptions.JSONDecodeError:
-                logging.error("Failed to decode JSON response")
+                logger.error("Failed to decode JSON response")
 
-        logging.error(f"Unexpected response status: {response.status_code}, {response.text}, {response.headers}")
+        logger.error("Unexpected response status: %s, %s, %s", response.status_code, response.text, response.headers)
         return jsonify({'error': 'An unexpected error occurred'}), 500
 
     except requests.exceptions.RequestException as e:
-        logging.exception("Error during API request")
+        logger.exception("Error during API request")
         return jsonify({'error': 'Failed to add team member', 'details': str(e)}), 500
@@ -0,0 +1,189 @@
+# shared_cache.py
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import logging
+from dotenv import load_dotenv
+from metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Values are unpickled on read, so the default lives in a directory only this user can write
+CACHE_DIR = os.environ.get('CACHE_DIR', os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'kdl_mini_scripts'))
+CACHE_PATH = os.environ.get('CACHE_PATH', os.path.join(CACHE_DIR, 'cache.sqlite3'))
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 10000))
+CACHE_DEFAULT_TTL = int(os.environ.get('CACHE_DEFAULT_TTL', 3600))
+# CACHE_ENABLED=false turns every lookup into a miss, e.g. for cold-path benchmarks
+CACHE_ENABLED = os.environ.get('CACHE_ENABLED', 'true').lower() == 'true'
+
+_MISSING = object()
+
+
+def private_dir(path):
+    """Create path with 0700 permissions and refuse to use it if anyone else can write to it"""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.stat(path)
+    if info.st_uid != os.getuid() or info.st_mode & 0o022:
+        raise PermissionError(f"{path} must be owned by this user and not group/world-writable")
+    return path
+
+
+class SharedCache:
+    """Key/value cache stored in SQLite (WAL mode) so all worker processes share it.
+
+    Values are pickled, so anything the blueprints produce (dicts, tuples, bytes)
+    can be stored. Expired rows are ignored on read and removed during eviction.
+    If the cache file or its directory can't be used, reads miss and writes are
+    skipped (and logged), so routes keep working without the cache.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=CACHE_MAX_ENTRIES, default_ttl=CACHE_DEFAULT_TTL,
+                 enabled=CACHE_ENABLED):
+        self.path = path
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._local = threading.local()
+
+    def _connect(self):
+        # One connection per thread, and a fresh one after a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        private_dir(os.path.dirname(os.path.abspath(self.path)))
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            ' key TEXT PRIMARY KEY,'
+            ' value BLOB NOT NULL,'
+            ' expires_at REAL,'
+            ' stored_at REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS cache_stored_at ON cache (stored_at)')
+        conn.execute('CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS worker_metrics ('
+            ' worker TEXT PRIMARY KEY,'
+            ' snapshot TEXT NOT NULL,'
+            ' updated_at REAL NOT NULL)'
+        )
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key, default=None):
+        if not self.enabled:
+            record_cache_lookup(key, hit=False)
+            return default
+        try:
+            row = self._connect().execute(
+                'SELECT value, expires_at FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"Cache read failed for {key}: {str(e)}")
+            return default
+
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            record_cache_lookup(key, hit=False)
+            return default
+        record_cache_lookup(key, hit=True)
+        return pickle.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        if not self.enabled:
+            return
+        ttl = self.default_ttl if ttl is None else ttl
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        try:
+            conn = self._connect()
+            conn.execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires_at, stored_at) VALUES (?, ?, ?, ?)',
+                (key, pickle.dumps(value), expires_at, now)
+            )
+            self._evict(conn, now)
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"Cache write failed for {key}: {str(e)}")
+
+    def add(self, key, value, ttl=None):
+        """Store value only if key is absent or expired; returns whether it was stored.
+
+        The check and insert are one statement, so of several workers adding the
+        same key at once exactly one succeeds, which makes it usable as a lock.
+        With the cache disabled or unavailable every caller succeeds.
+        """
+        if not self.enabled:
+            return True
+        ttl = self.default_ttl if ttl is None else ttl
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        try:
+            cursor = self._connect().execute(
+                'INSERT INTO cache (key, value, expires_at, stored_at) VALUES (?, ?, ?, ?)'
+                ' ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at,'
+                ' stored_at = excluded.stored_at'
+                ' WHERE cache.expires_at IS NOT NULL AND cache.expires_at <= ?',
+                (key, pickle.dumps(value), expires_at, now, now)
+            )
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"Cache add failed for {key}: {str(e)}")
+            return True
+        return cursor.rowcount == 1
+
+    def delete(self, key):
+        try:
+            self._connect().execute('DELETE FROM cache WHERE key = ?', (key,))
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"Cache delete failed for {key}: {str(e)}")
+
+    def clear(self):
+        self._connect().execute('DELETE FROM cache')
+
+    def get_or_set(self, key, func, ttl=None):
+        """Return the cached value for key, calling func() to fill it on a miss.
+
+        None results are not cached, so failed lookups are retried next time.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = func()
+        if value is not None:
+            self.set(key, value, ttl=ttl)
+        return value
+
+    def store_worker_metrics(self, worker, snapshot):
+        """Save one worker's metrics snapshot (a JSON string); ignores CACHE_ENABLED"""
+        self._connect().execute(
+            'INSERT OR REPLACE INTO worker_metrics (worker, snapshot, updated_at) VALUES (?, ?, ?)',
+            (worker, snapshot, time.time())
+        )
+
+    def worker_metrics(self, max_age):
+        """Return {worker: (snapshot, updated_at)} for every worker that reported within max_age seconds"""
+        conn = self._connect()
+        conn.execute('DELETE FROM worker_metrics WHERE updated_at < ?', (time.time() - max_age,))
+        rows = conn.execute('SELECT worker, snapshot, updated_at FROM worker_metrics').fetchall()
+        return {worker: (snapshot, updated_at) for worker, snapshot, updated_at in rows}
+
+    def _evict(self, conn, now):
+        # Drop expired rows first, then the oldest rows until we are back under the cap
+        conn.execute('DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?', (now,))
+        (count,) = conn.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if count > self.max_entries:
+            conn.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY stored_at LIMIT ?)',
+                (count - self.max_entries,)
+            )
+
+
+cache = SharedCache()
@@ -1,13 +1,29 @@
-import asyncio
-from hypercorn.config import Config
-from hypercorn.asyncio import serve
-from main import app
 import os
+import socket
+from hypercorn.config import Config as HypercornConfig
+from hypercorn.run import run
+
+
+class Config(HypercornConfig):
+    def create_sockets(self):
+        sockets = super().create_sockets()
+        # hypercorn creates its sockets with proto=0, so asyncio never turns on
+        # TCP_NODELAY for them and keep-alive responses stall ~40ms on Nagle +
+        # delayed ACK. Accepted connections inherit the option from the listener.
+        for sock in sockets.secure_sockets + sockets.insecure_sockets:
+            if sock.family in (socket.AF_INET, socket.AF_INET6):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sockets
+
 
 config = Config()
+config.application_path = "main:app"
 config.bind = [f"0.0.0.0:{int(os.environ.get('PORT', 10000))}"]
 config.timeout = 300
 config.graceful_timeout = 300
 config.keep_alive_timeout = 300
+# WEB_CONCURRENCY=0 serves from this process; N>0 spawns N worker processes
+config.workers = int(os.environ.get('WEB_CONCURRENCY', 1))
 
-asyncio.run(serve(app, config))
+if __name__ == "__main__":
+    run(config)
@@ -5,18 +5,31 @@ from asyncio import Semaphore, sleep
 import aiohttp
 from dotenv import load_dotenv
 import logging
+import time
 from datetime import datetime
+import metrics
+from metrics import track_upstream
+from shared_cache import cache
 from . import submissions_bp
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 SUBMITTABLE_API_KEY = os.getenv('SUBMITTABLE_API_KEY')
+SUBMITTABLE_API_URL = os.getenv('SUBMITTABLE_API_URL', 'https://submittable-api.submittable.com/v4')
 TIMEOUT = aiohttp.ClientTimeout(total=60)
 
-RATE_LIMIT = 1  # Maximum number of requests per second (adjust per API documentation)
+RATE_LIMIT = int(os.getenv('SUBMITTABLE_RATE_LIMIT', 1))  # Maximum number of requests per second (adjust per API documentation)
+
+# A full crawl takes minutes at RATE_LIMIT, so share the result across workers
+RESULTS_CACHE_KEY = 'submissions:two_reviews'
+RESULTS_CACHE_TTL = int(os.getenv('SUBMISSIONS_CACHE_TTL', 600))
+# Last good result, served while another request is recrawling
+STALE_RESULTS_CACHE_KEY = 'submissions:two_reviews_stale'
+STALE_RESULTS_CACHE_TTL = int(os.getenv('SUBMISSIONS_STALE_CACHE_TTL', 24 * 3600))
+# Only the request holding this lock crawls; it expires in case that worker dies mid-crawl
+CRAWL_LOCK_KEY = 'submissions:crawl_lock'
+CRAWL_LOCK_TTL = int(os.getenv('SUBMISSIONS_CRAWL_LOCK_TTL', 900))
 
 async def rate_limited_request(task, *args, semaphore=None, **kwargs):
     if semaphore:
@@ -26,7 +39,7 @@ async def rate_limited_request(task, *args, semaphore=None, **kwargs):
                 await sleep(1 / RATE_LIMIT)  # Introduce delay to adhere to rate limits
                 return result
             except Exception as e:
-                logger.error(f"Rate-limited request failed: {str(e)}")
+                logger.error("Rate-limited request failed: %s", e)
                 raise
     else:
         return await task(*args, **kwargs)
@@ -45,7 +58,7 @@ async def get_submissions_page(session, continuation_token=None, size=50):
     semaphore = Semaphore(RATE_LIMIT)
     
     async def task():
-        url = 'https://submittable-api.submittable.com/v4/submissions'
+        url = f'{SUBMITTABLE_API_URL}/submissions'
         projects = ['64c81590-b089-43f1-bc68-d5011b0321ec', #Write Michigan 2024-25 All Ages
                     'b10c6ce7-054e-4869-a86c-5e19faf49aa6'] #WM 2024-25 NO FEE
         params = {'size': size, 'Projects.Include': projects, 'Statuses.Include': ['completed']}
@@ -53,20 +66,22 @@ async def get_submissions_page(session, continuation_token=None, size=50):
             params['continuationToken'] = continuation_token
 
         try:
-            logger.info(f"Fetching submissions page with token: {continuation_token}")
-            async with session.get(url, params=params) as response:
-                if response.status == 401:
-                    logger.error("Authentication failed - check your API key")
-                    return {'items': [], 'continuationToken': None}
-                response.raise_for_status()
-                return await response.json()
+            logger.info("Fetching submissions page with token: %s", continuation_token)
+            with track_upstream('submittable') as call:
+                async with session.get(url, params=params) as response:
+                    call['status'] = response.status
+                    if response.status == 401:
+                        logger.error("Authentication failed - check your API key")
+                        return {'items': [], 'continuationToken': None}
+                    response.raise_for_status()
+                    return await response.json()
 
         except asyncio.TimeoutError:
-            logger.error(f"Timeout getting submissions page with token {continuation_token}")
+            logger.error("Timeout getting submissions page with token %s", continuation_token)
             return {'items': [], 'continuationToken': None}
         except Exception as e:
-            logger.error(f"Error getting submissions page: {str(e)}")
-            logger.error(f"Error type: {type(e)}")
+            logger.error("Error getting submissions page: %s", e)
+            logger.error("Error type: %s", type(e))
             return {'items': [], 'continuationToken': None}
 
     return await rate_limited_request(task, semaphore=semaphore)
@@ -75,24 +90,26 @@ async def get_reviews(session, submission_id):
     semaphore = Semaphore(RATE_LIMIT)
     
     async def task():
-        url = f'https://submittable-api.submittable.com/v4/entries/submissions/{submission_id}/reviews'
+        url = f'{SUBMITTABLE_API_URL}/entries/submissions/{submission_id}/reviews'
 
         try:
-            logger.info(f"Fetching reviews for submission {submission_id}")
-            async with session.get(url) as response:
-                response.raise_for_status()
-                return await response.json()
+            logger.info("Fetching reviews for submission %s", submission_id)
+            with track_upstream('submittable') as call:
+                async with session.get(url) as response:
+                    call['status'] = response.status
+                    response.raise_for_status()
+                    return await response.json()
         except asyncio.TimeoutError:
-            logger.error(f"Timeout getting reviews for submission {submission_id}")
+            logger.error("Timeout getting reviews for submission %s", submission_id)
             return []
         except Exception as e:
-            logger.error(f"Error getting reviews for submission {submission_id}: {str(e)}")
+            logger.error("Error getting reviews for submission %s: %s", submission_id, e)
             return []
 
     return await rate_limited_request(task, semaphore=semaphore)
 
 async def process_submission_batch(session, submissions):
-    logger.info(f"Processing batch of {len(submissions)} submissions")
+    logger.info("Processing batch of %s submissions", len(submissions))
     tasks = []
     for submission in submissions:
         submission_id = submission.get('submissionId')
@@ -105,21 +122,22 @@ async def process_submission_batch(session, submissions):
     try:
         results = await asyncio.gather(*tasks, return_exceptions=True)
         valid_results = [r for r in results if r is not None and not isinstance(r, Exception)]
-        logger.info(f"Processed batch: {len(valid_results)} valid results out of {len(results)} total")
+        logger.info("Processed batch: %s valid results out of %s total", len(valid_results), len(results))
         return valid_results
     except Exception as e:
-        logger.error(f"Error processing submission batch: {str(e)}")
+        logger.error("Error processing submission batch: %s", e)
         return []
 
 async def process_single_submission(session, submission):
     submission_id = submission.get('submissionId')
     try:
-        logger.info(f"Processing submission {submission_id}")
+        logger.info("Processing submission %s", submission_id)
         reviews = await get_reviews(session, submission_id)
+        metrics.crawl_submissions.inc()
         completed_reviews = [r for r in reviews if r.get('status') == 'completed']
         
         if len(completed_reviews) >= 2:
-            logger.info(f"Submission {submission_id} has {len(completed_reviews)} completed reviews")
+            logger.info("Submission %s has %d completed reviews", submission_id, len(completed_reviews))
             return {
                 'submission_id': submission_id,
                 'title': submission.get('submissionTitle'),
@@ -127,10 +145,10 @@ async def process_single_submission(session, submission):
                 'review_count': len(completed_reviews),
                 'last_review_date': max(r.get('completedAt', '') for r in completed_reviews)
             }
-        logger.info(f"Submission {submission_id} only has {len(completed_reviews)} completed reviews")
+        logger.info("Submission %s only has %d completed reviews", submission_id, len(completed_reviews))
         return None
     except Exception as e:
-        logger.error(f"Error processing submission {submission_id}: {str(e)}")
+        logger.error("Error processing submission %s: %s", submission_id, e)
         return None
 
 async def find_submissions_with_two_reviews():
@@ -140,13 +158,16 @@ async def find_submissions_with_two_reviews():
     async with await get_session() as session:
         submissions_with_two_reviews = []
         continuation_token = None
+        started = time.monotonic()
+        metrics.crawl_in_progress.inc()
         
         try:
             page_count = 0
             while True:
                 page_count += 1
-                logger.info(f"Fetching page {page_count}")
+                logger.info("Fetching page %s", page_count)
                 result = await rate_limited_request(get_submissions_page, session, continuation_token, semaphore=semaphore)
+                metrics.crawl_pages.inc()
                 if not result.get('items'):
                     logger.warning("No items received in response")
                     break
@@ -155,18 +176,56 @@ async def find_submissions_with_two_reviews():
                 submissions_with_two_reviews.extend(batch_results)
                 
                 continuation_token = result.get('continuationToken')
-                logger.info(f"Current submissions count: {len(submissions_with_two_reviews)}")
+                logger.info("Current submissions count: %s", len(submissions_with_two_reviews))
                 if not continuation_token:
                     logger.info("No more pages to fetch")
                     break
                     
-            logger.info(f"Found total of {len(submissions_with_two_reviews)} submissions with 2+ reviews")
+            logger.info("Found total of %s submissions with 2+ reviews", len(submissions_with_two_reviews))
+            metrics.crawl_last_duration.set(time.monotonic() - started)
+            metrics.crawl_last_completed.set(time.time())
             return sorted(submissions_with_two_reviews, 
                          key=lambda x: x['last_review_date'], 
                          reverse=True)
         except Exception as e:
-            logger.error(f"Error in find_submissions_with_two_reviews: {str(e)}")
+            logger.error("Error in find_submissions_with_two_reviews: %s", e)
             return []
+        finally:
+            metrics.crawl_in_progress.inc(-1)
+
+async def get_submissions_with_two_reviews():
+    """Crawl results from the shared cache, crawling at most once at a time across all workers.
+
+    While another request holds the crawl lock, serve the previous result if
+    there is one, otherwise wait for the crawl to finish.
+    """
+    results = cache.get(RESULTS_CACHE_KEY)
+    if results is not None:
+        logger.info("Using cached submissions")
+        return results
+
+    while not cache.add(CRAWL_LOCK_KEY, os.getpid(), ttl=CRAWL_LOCK_TTL):
+        results = cache.get(STALE_RESULTS_CACHE_KEY)
+        if results is not None:
+            logger.info("Crawl already running, using previous submissions")
+            return results
+        await sleep(1)
+        results = cache.get(RESULTS_CACHE_KEY)
+        if results is not None:
+            return results
+
+    try:
+        # Another request may have finished a crawl between our miss and taking the lock
+        results = cache.get(RESULTS_CACHE_KEY)
+        if results is None:
+            results = await find_submissions_with_two_reviews()
+            # An empty list usually means the crawl failed, so don't hold on to it
+            if results:
+                cache.set(RESULTS_CACHE_KEY, results, ttl=RESULTS_CACHE_TTL)
+                cache.set(STALE_RESULTS_CACHE_KEY, results, ttl=STALE_RESULTS_CACHE_TTL)
+    finally:
+        cache.delete(CRAWL_LOCK_KEY)
+    return results
 
 @submissions_bp.route('/')
 async def show_submissions():
@@ -174,13 +233,13 @@ async def show_submissions():
         logger.info("Starting show_submissions route")
         # Print the API key length to debug (don't print the actual key!)
         if SUBMITTABLE_API_KEY:
-            logger.info(f"API key is present (length: {len(SUBMITTABLE_API_KEY)})")
+            logger.info("API key is present (length: %s)", len(SUBMITTABLE_API_KEY))
         else:
             logger.error("No API key found!")
             
-        results = await find_submissions_with_two_reviews()
-        logger.info(f"Rendering template with {len(results)} submissions")
+        results = await get_submissions_with_two_reviews()
+        logger.info("Rendering template with %s submissions", len(results))
         return render_template('submission_review/submissions.html', submissions=results)
     except Exception as e:
-        logger.error(f"Error in show_submissions: {str(e)}")
+        logger.error("Error in show_submissions: %s", e)
         return f"Error: {str(e)}", 500
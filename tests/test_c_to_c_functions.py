@@ -0,0 +1,22 @@
+from geopy import exc as geopy_exc
+from geopy.adapters import AdapterHTTPError
+
+from address_to_library_card_type.c_to_c_functions import geocoder_error_status
+
+
+def test_status_taken_from_chained_http_error():
+    try:
+        try:
+            raise AdapterHTTPError('Non-successful status code 502', status_code=502, headers={}, text='')
+        except AdapterHTTPError as http_error:
+            raise geopy_exc.GeocoderServiceError('Bad gateway') from http_error
+    except geopy_exc.GeocoderServiceError as e:
+        assert geocoder_error_status(e) == 502
+
+
+def test_status_falls_back_to_exception_class():
+    assert geocoder_error_status(geopy_exc.GeocoderRateLimited('slow down')) == 429
+    assert geocoder_error_status(geopy_exc.GeocoderUnavailable('refused')) == 503
+    assert geocoder_error_status(geopy_exc.GeocoderTimedOut('timeout')) == 504
+    assert geocoder_error_status(geopy_exc.GeocoderServiceError('boom')) == 500
+    assert geocoder_error_status(geopy_exc.GeopyError('other')) == 'error'
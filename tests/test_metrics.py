@@ -0,0 +1,117 @@
+import json
+import time
+
+import pytest
+
+import metrics
+import shared_cache
+
+
+@pytest.fixture
+def histogram():
+    metric = metrics.Histogram('test_latency_seconds', 'Test latency.', ['route'], buckets=(0.1, 1))
+    yield metric
+    metrics._registry.remove(metric)
+
+
+@pytest.fixture
+def isolated_cache(tmp_path, monkeypatch):
+    cache = shared_cache.SharedCache(str(tmp_path / 'cache.sqlite3'))
+    monkeypatch.setattr(shared_cache, 'cache', cache)
+    return cache
+
+
+def test_histogram_renders_cumulative_buckets(histogram):
+    for value in (0.05, 0.5, 0.7, 5):
+        histogram.observe(value, route='/book-cover')
+
+    lines = histogram.render({tuple(key): value for key, value in histogram.snapshot()})
+
+    assert lines == [
+        '# HELP test_latency_seconds Test latency.',
+        '# TYPE test_latency_seconds histogram',
+        'test_latency_seconds_bucket{route="/book-cover",le="0.1"} 1',
+        'test_latency_seconds_bucket{route="/book-cover",le="1"} 3',
+        'test_latency_seconds_bucket{route="/book-cover",le="+Inf"} 4',
+        'test_latency_seconds_sum{route="/book-cover"} 6.25',
+        'test_latency_seconds_count{route="/book-cover"} 4',
+    ]
+
+
+def test_label_values_are_escaped():
+    assert metrics._format_labels(('route',), ('a"b\\c\nd',)) == '{route="a\\"b\\\\c\\nd"}'
+
+
+def test_render_sums_every_workers_snapshot(isolated_cache, histogram):
+    histogram.observe(0.05, route='/book-cover')
+    other_worker = {
+        'test_latency_seconds': [[['/book-cover'], [[0, 2], 1.0, 2]]],
+        'cache_requests_total': [[['bookcover', 'hit'], 3], [['bookcover', 'miss'], 1]],
+        'submission_crawl_last_completed_timestamp_seconds': [[[], 2000.0]],
+    }
+    isolated_cache.store_worker_metrics('other-worker', json.dumps(other_worker))
+
+    merged = metrics.collect()
+    assert merged['test_latency_seconds'][('/book-cover',)] == [[1, 2], 1.05, 3]
+    assert merged['cache_requests_total'][('bookcover', 'hit')] >= 3
+    assert merged['submission_crawl_last_completed_timestamp_seconds'][()] >= 2000.0
+
+    text = metrics.render(merged)
+    assert 'test_latency_seconds_count{route="/book-cover"} 3' in text
+    assert 'cache_hit_ratio{namespace="bookcover"}' in text
+
+
+def test_gauges_merge_by_sum_or_max():
+    in_progress = metrics.Gauge('test_in_progress', 'Test.')
+    last_seen = metrics.Gauge('test_last_seen', 'Test.', aggregate='max')
+    try:
+        assert in_progress.merge(in_progress.merge(None, 1), 2) == 3
+        assert last_seen.merge(last_seen.merge(None, 10), 5) == 10
+    finally:
+        metrics._registry.remove(in_progress)
+        metrics._registry.remove(last_seen)
+
+
+def test_track_upstream_records_status_and_errors():
+    before_ok = metrics.upstream_requests.value(upstream='test_upstream', status=200)
+    before_error = metrics.upstream_requests.value(upstream='test_upstream', status='error')
+
+    with metrics.track_upstream('test_upstream') as call:
+        call['status'] = 200
+    with pytest.raises(ValueError):
+        with metrics.track_upstream('test_upstream'):
+            raise ValueError
+
+    assert metrics.upstream_requests.value(upstream='test_upstream', status=200) == before_ok + 1
+    assert metrics.upstream_requests.value(upstream='test_upstream', status='error') == before_error + 1
+
+
+def store_snapshot(cache, worker, snapshot, updated_at):
+    cache.store_worker_metrics(worker, json.dumps(snapshot))
+    cache._connect().execute('UPDATE worker_metrics SET updated_at = ? WHERE worker = ?', (updated_at, worker))
+
+
+def test_stopped_workers_keep_counters_but_not_summed_gauges(isolated_cache):
+    store_snapshot(isolated_cache, 'stopped-worker', {
+        'submission_crawl_in_progress': [[[], 1]],
+        'submission_crawl_pages_total': [[[], 7]],
+    }, time.time() - 10 * metrics.METRICS_LIVE_WINDOW)
+
+    merged = metrics.collect()
+    assert merged['submission_crawl_in_progress'].get((), 0) == 0
+    assert merged['submission_crawl_pages_total'][()] >= 7
+
+
+def test_last_crawl_duration_comes_from_the_most_recent_crawl(isolated_cache):
+    store_snapshot(isolated_cache, 'older-worker', {
+        'submission_crawl_last_completed_timestamp_seconds': [[[], 4000.0]],
+        'submission_crawl_last_duration_seconds': [[[], 300.0]],
+    }, time.time() - 10 * metrics.METRICS_LIVE_WINDOW)
+    store_snapshot(isolated_cache, 'newer-worker', {
+        'submission_crawl_last_completed_timestamp_seconds': [[[], 5000.0]],
+        'submission_crawl_last_duration_seconds': [[[], 60.0]],
+    }, time.time())
+
+    text = metrics.render()
+    assert 'submission_crawl_last_completed_timestamp_seconds 5000.0' in text
+    assert 'submission_crawl_last_duration_seconds 60.0' in text
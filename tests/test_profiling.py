@@ -0,0 +1,97 @@
+import asyncio
+import json
+import pathlib
+import time
+
+import pytest
+from flask import Flask
+
+import profiling
+
+SECRET = 'test-secret'
+
+
+@pytest.fixture
+def profiled_app(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILING_ENABLED', True)
+    monkeypatch.setattr(profiling, 'PROFILING_SECRET', SECRET)
+    monkeypatch.setattr(profiling, 'PROFILE_DIR', str(tmp_path / 'profiles'))
+    monkeypatch.setattr(profiling, 'PROFILING_INTERVAL', 0.002)
+
+    app = Flask(__name__)
+
+    @app.route('/plain')
+    def plain():
+        return 'ok'
+
+    @app.route('/slow-upstream')
+    async def slow_upstream():
+        await wait_for_upstream()
+        deadline = time.thread_time() + 0.05
+        while time.thread_time() < deadline:
+            pass
+        return 'ok'
+
+    profiling.init_app(app)
+    return app
+
+
+async def wait_for_upstream():
+    await asyncio.sleep(0.1)
+
+
+def saved_profiles():
+    return [json.loads(path.read_text()) for path in sorted(pathlib.Path(profiling.PROFILE_DIR).glob('*.json'))]
+
+
+def test_signature_is_valid(monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILING_SECRET', SECRET)
+    value = profiling.sign('/bookcover/book-cover')
+
+    assert profiling.signature_is_valid(value, '/bookcover/book-cover')
+    assert not profiling.signature_is_valid(value, '/submission_review/')
+    assert not profiling.signature_is_valid(profiling.sign('/bookcover/book-cover', secret='other'),
+                                            '/bookcover/book-cover')
+    assert not profiling.signature_is_valid(profiling.sign('/bookcover/book-cover', ttl=-1),
+                                            '/bookcover/book-cover')
+    assert not profiling.signature_is_valid('not-a-signature', '/bookcover/book-cover')
+    assert not profiling.signature_is_valid(None, '/bookcover/book-cover')
+
+
+def test_signature_is_never_valid_without_a_secret(monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILING_SECRET', '')
+    assert not profiling.signature_is_valid(profiling.sign('/', secret='anything'), '/')
+
+
+@pytest.mark.parametrize('header', ['9999999999:pä', '²:abc'])
+def test_malformed_signature_does_not_break_requests(profiled_app, header):
+    response = profiled_app.test_client().get('/plain', headers={profiling.SIGNATURE_HEADER: header})
+    assert response.status_code == 200
+    assert not saved_profiles()
+
+
+def test_admin_rejects_non_ascii_token(profiled_app):
+    client = profiled_app.test_client()
+    assert client.get('/admin/profiles', headers={'Authorization': 'Bearer pässword'}).status_code == 403
+    assert client.get('/admin/profiles', headers={'Authorization': f'Bearer {SECRET}'}).status_code == 200
+
+
+def test_async_view_is_sampled_on_its_event_loop(profiled_app):
+    client = profiled_app.test_client()
+    response = client.get('/slow-upstream',
+                          headers={profiling.SIGNATURE_HEADER: profiling.sign('/slow-upstream')})
+    assert response.status_code == 200
+
+    [profile] = saved_profiles()
+    assert profile['route'] == '/slow-upstream'
+    # The busy loop runs on asgiref's loop thread, not the request thread
+    assert profile['cpu_seconds'] >= 0.05
+
+    stacks = profile['stacks']
+    waiting = sum(count for stack, count in stacks.items()
+                  if 'wait_for_upstream' in stack and stack.endswith('(waiting)'))
+    working = sum(count for stack, count in stacks.items()
+                  if 'slow_upstream' in stack and not stack.endswith('(waiting)'))
+    assert waiting > 0
+    assert working > 0
+    assert not any('asgiref' in stack.rsplit(';', 1)[-1] for stack in stacks)
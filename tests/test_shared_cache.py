@@ -0,0 +1,144 @@
+import os
+import sys
+
+import pytest
+
+import shared_cache
+from shared_cache import SharedCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SharedCache(str(tmp_path / 'cache.sqlite3'), max_entries=3, default_ttl=60)
+
+
+def test_set_and_get_round_trip(cache):
+    cache.set('bookcover:image:1', (b'GIF89a', 'image/gif'))
+    assert cache.get('bookcover:image:1') == (b'GIF89a', 'image/gif')
+    assert cache.get('bookcover:image:2', 'missing') == 'missing'
+
+
+def test_entries_expire_after_ttl(cache, monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(shared_cache.time, 'time', lambda: now)
+    cache.set('geocode:a', 'short', ttl=10)
+    cache.set('geocode:b', 'default')
+
+    now = 1009.0
+    assert cache.get('geocode:a') == 'short'
+    now = 1010.0
+    assert cache.get('geocode:a') is None
+    assert cache.get('geocode:b') == 'default'
+    now = 1060.0
+    assert cache.get('geocode:b') is None
+
+
+def test_oldest_entries_evicted_beyond_max_entries(cache, monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(shared_cache.time, 'time', lambda: now)
+    for i in range(5):
+        cache.set(f'k:{i}', i)
+        now += 1
+
+    assert [cache.get(f'k:{i}') for i in range(5)] == [None, None, 2, 3, 4]
+
+
+def test_expired_entries_evicted_before_live_ones(cache, monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(shared_cache.time, 'time', lambda: now)
+    cache.set('k:old', 'old')
+    cache.set('k:short', 'short', ttl=1)
+    cache.set('k:mid', 'mid')
+    now = 1005.0
+    cache.set('k:new', 'new')
+
+    assert cache.get('k:old') == 'old'
+    assert cache.get('k:short') is None
+    assert cache.get('k:new') == 'new'
+
+
+def test_get_or_set_does_not_cache_none(cache):
+    calls = []
+
+    def lookup():
+        calls.append(1)
+        return None
+
+    assert cache.get_or_set('geocode:nowhere', lookup) is None
+    assert cache.get_or_set('geocode:nowhere', lookup) is None
+    assert len(calls) == 2
+
+
+def test_get_or_set_caches_values(cache):
+    calls = []
+
+    def lookup():
+        calls.append(1)
+        return (42.9, -85.6)
+
+    assert cache.get_or_set('geocode:ada', lookup) == (42.9, -85.6)
+    assert cache.get_or_set('geocode:ada', lookup) == (42.9, -85.6)
+    assert len(calls) == 1
+
+
+def test_disabled_cache_always_misses(tmp_path):
+    cache = SharedCache(str(tmp_path / 'cache.sqlite3'), enabled=False)
+    cache.set('k:a', 1)
+    assert cache.get('k:a') is None
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs os.fork')
+def test_reconnects_after_fork(cache):
+    cache.set('k:parent', 'from parent')
+    parent_conn = cache._connect()
+
+    pid = os.fork()
+    if pid == 0:
+        # Child: must not reuse the parent's connection
+        ok = cache._connect() is not parent_conn and cache.get('k:parent') == 'from parent'
+        cache.set('k:child', 'from child')
+        os._exit(0 if ok else 1)
+
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert cache._connect() is parent_conn
+    assert cache.get('k:child') == 'from child'
+
+
+def test_refuses_shared_directory(tmp_path):
+    shared = tmp_path / 'shared'
+    shared.mkdir()
+    shared.chmod(0o777)
+    with pytest.raises(PermissionError):
+        shared_cache.private_dir(str(shared))
+
+    # The cache refuses it too, but as a miss rather than an error in the route
+    cache = SharedCache(str(shared / 'cache.sqlite3'))
+    cache.set('k:a', 'value')
+    assert cache.get('k:a') is None
+    assert not (shared / 'cache.sqlite3').exists()
+
+
+def test_unusable_cache_dir_behaves_as_a_miss(tmp_path):
+    cache = SharedCache(str(tmp_path / 'missing' / 'file' / 'cache.sqlite3'))
+    (tmp_path / 'missing').write_text('not a directory')
+
+    cache.set('bookcover:image:1', 'value')
+    assert cache.get('bookcover:image:1', 'fallback') == 'fallback'
+    assert cache.get_or_set('bookcover:image:1', lambda: 'fresh') == 'fresh'
+    cache.delete('bookcover:image:1')
+
+
+def test_add_only_stores_absent_or_expired_keys(cache, monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(shared_cache.time, 'time', lambda: now)
+    assert cache.add('submissions:crawl_lock', 'first', ttl=10)
+    assert not cache.add('submissions:crawl_lock', 'second', ttl=10)
+    assert cache.get('submissions:crawl_lock') == 'first'
+
+    now = 1010.0
+    assert cache.add('submissions:crawl_lock', 'third', ttl=10)
+    assert cache.get('submissions:crawl_lock') == 'third'
+
+    cache.delete('submissions:crawl_lock')
+    assert cache.add('submissions:crawl_lock', 'fourth', ttl=10)
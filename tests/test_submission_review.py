@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+import shared_cache
+from submission_review import routes
+
+
+@pytest.fixture
+def isolated_cache(tmp_path, monkeypatch):
+    cache = shared_cache.SharedCache(str(tmp_path / 'cache.sqlite3'))
+    monkeypatch.setattr(routes, 'cache', cache)
+    return cache
+
+
+@pytest.fixture
+def crawls(monkeypatch):
+    started = []
+
+    async def fake_crawl():
+        started.append(1)
+        await asyncio.sleep(0.2)
+        return [{'id': len(started)}]
+
+    monkeypatch.setattr(routes, 'find_submissions_with_two_reviews', fake_crawl)
+    monkeypatch.setattr(routes, 'sleep', lambda seconds: asyncio.sleep(0.05))
+    return started
+
+
+def test_concurrent_misses_share_one_crawl(isolated_cache, crawls):
+    async def many():
+        return await asyncio.gather(*(routes.get_submissions_with_two_reviews() for _ in range(5)))
+
+    assert asyncio.run(many()) == [[{'id': 1}]] * 5
+    assert len(crawls) == 1
+    assert isolated_cache.get(routes.CRAWL_LOCK_KEY) is None
+
+
+def test_stale_results_served_while_another_request_crawls(isolated_cache, crawls):
+    isolated_cache.set(routes.STALE_RESULTS_CACHE_KEY, [{'id': 'stale'}])
+    isolated_cache.add(routes.CRAWL_LOCK_KEY, 'other worker', ttl=60)
+
+    assert asyncio.run(routes.get_submissions_with_two_reviews()) == [{'id': 'stale'}]
+    assert not crawls